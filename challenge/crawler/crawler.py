@@ -1,8 +1,10 @@
 import asyncio
+import html
 import logging
 import re
 import aiohttp
-from collections import Counter
+from collections import Counter, deque
+from typing import Iterable
 from bs4 import BeautifulSoup
 
 from challenge.utils.results_printer import print_single_element
@@ -14,20 +16,34 @@ logger = logging.getLogger('crawler')
 class Crawler:
     """
     Crawler class to be used to crawl through web pages.
-    Usage: instantiate an object of this Class and run "crawl"
+    Usage: instantiate an object of this Class and run "crawl". On Linux and macOS, running it on a uvloop event loop,
+    if uvloop is installed, makes the HTTP requests faster
     """
     __slots__ = ['url', 'crawled_urls', 'headers', 'domain_filter', 'max_runners', 'print_in_real_time',
                  'max_retries', 'sleep_between_retries', 'max_depth', 'regex_search', 'assume_parent_protocol',
-                 'sleep_after_request', 'concurrent_requests_limit', '_session', '_queue', '_limit']
+                 'sleep_after_request', 'concurrent_requests_limit', 'use_html_parser', 'session', '_session', '_queue',
+                 '_enqueued', '_foreign_url_regex']
 
     _default_headers = {
         'User-Agent': 'Mozilla/5.0',
     }
 
+    # Comments and the bodies of script, style, textarea and title tags are matched too (without capturing a value) so
+    # that the links written inside them are skipped. The attributes before href are consumed whole, so an href
+    # written inside another attribute's value is never matched
+    _href_regex = re.compile(
+        r'<!--.*?(?:-->|\Z)'
+        r'|<(script|style|textarea|title)\b[^>]*>.*?(?:</\1\s*>|\Z)'
+        r'|<a(?=[\s/])(?:[\s/]*(?!href\s*=)[^\s"\'>/=]+(?![^\s"\'>/=])'
+        r'(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s"\'>][^\s>]*(?![^\s>])))?)*?'
+        r'[\s/]*(?<=[\s/"\'])href\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>][^\s>]*))',
+        re.IGNORECASE | re.DOTALL)
+
     def __init__(self, url: str, headers: dict = None, regex_search: bool = False, domain_filter: bool = True,
                  max_runners: int = 100, print_in_real_time: bool = False, max_retries: int = 5,
                  sleep_between_retries: float = 0.3, max_depth: int = None, assume_parent_protocol: bool = True,
-                 sleep_after_request: float = 0, concurrent_requests_limit: int = None):
+                 sleep_after_request: float = 0, concurrent_requests_limit: int = None, use_html_parser: bool = False,
+                 session: aiohttp.ClientSession = None):
         """
         :param url: the root url for crawling
         :param headers: the headers to use for the HTTP requests. A default one
@@ -47,7 +63,12 @@ class Crawler:
         :param max_depth: the max depth allowed for crawling. It can be None or 0 or a positive number, otherwise it is set to 0
         :param sleep_after_request: number of seconds to sleep after each request. It must be 0 or a positive integer number,
         otherwise it is set to 0
-        :param concurrent_requests_limit: the limit of concurrent HTTP requests that the crawler can perform. It's None by default
+        :param concurrent_requests_limit: the limit of concurrent HTTP requests that the crawler can perform. It's None by default,
+        in which case the default limit of 100 connections of aiohttp is used. It's ignored if a session is given
+        :param use_html_parser: if True, the href attributes of a tags are found by parsing the whole page with BeautifulSoup.
+        Otherwise, they are found with a faster regex matching on the page, without building the HTML tree
+        :param session: an optional aiohttp ClientSession to be used for the HTTP requests, so that its connection pool can be
+        shared across multiple crawls. It will not be closed by the crawler. If None, a new session is created for each crawl
         """
         self.url = Url(url)
         self.crawled_urls = {}
@@ -64,51 +85,79 @@ class Crawler:
         self.assume_parent_protocol = assume_parent_protocol
         self.sleep_after_request = sleep_after_request if sleep_after_request >= 0 else 0
         self.concurrent_requests_limit = concurrent_requests_limit if concurrent_requests_limit and concurrent_requests_limit > 0 else None
+        self.use_html_parser = use_html_parser
+        self.session = session
         self._queue = None
         self._session = None
-        self._limit = None
+        self._enqueued = set()
+        # Only a non-empty host free of tabs and newlines (which split_url removes) is compared with the root domain. Any
+        # other absolute url is left to the exact domain filter, as its Url may take the domain of its parent
+        self._foreign_url_regex = re.compile(
+            r'(?:[a-zA-Z][a-zA-Z0-9+.-]*:)?//(?=[^/?#\t\r\n]+(?:[/?#]|\Z))(?!(?:www\.)?(?:' +
+            re.escape(self.url.domain) + r')?(?:[/?#]|\Z))',
+            re.IGNORECASE)
 
     async def crawl(self) -> dict:
         """
         It starts the crawling process
-        :return: a dictionary containing the crawled urls as keys and a list of all visited urls as values
-        """
-        if self.concurrent_requests_limit:
-            self._limit = asyncio.Semaphore(self.concurrent_requests_limit)
-        async with aiohttp.ClientSession(headers=self.headers) as self._session:
-            self._queue = asyncio.Queue()
-            logger.info('Start crawling from root URL: {}'.format(self.url.get_basic_url()))
-            self._queue.put_nowait((self.url, 0))
-            consumers = [asyncio.create_task(self._queue_processor()) for _ in range(self.max_runners)]
-            await self._queue.join()
-            for consumer in consumers:
-                consumer.cancel()
+        :return: a dictionary containing the crawled urls as keys and, as values, a Counter of the urls found in each
+        crawled url with the number of times they were found
+        """
+        if self.session:
+            self._session = self.session
+            await self._process_queue()
+        else:
+            connector = aiohttp.TCPConnector(limit=self.concurrent_requests_limit or 100, ttl_dns_cache=300,
+                                             keepalive_timeout=30)
+            async with aiohttp.ClientSession(connector=connector) as self._session:
+                await self._process_queue()
         return self.crawled_urls
 
-    async def _queue_processor(self) -> None:
+    async def _process_queue(self) -> None:
         """
-        Gets elements in the queue and processes them
+        Adds the root url to the queue and processes the queue until it is empty. A runner task is started for each url
+        in the queue, with at most self.max_runners of them running at the same time
         :return: None
         """
-        while True:
-            url_in_queue, depth = await self._queue.get()
-            basic_url_in_queue = url_in_queue.get_basic_url()
-            if basic_url_in_queue not in self.crawled_urls.keys():
-                self.crawled_urls[basic_url_in_queue] = []
-                urls = [url for url in await self._get_urls(url_in_queue) if
-                        url.get_basic_url() != basic_url_in_queue]
-                basic_urls = [url.get_basic_url() for url in urls]
-                self.crawled_urls[basic_url_in_queue] = basic_urls
-                if self.print_in_real_time:
-                    print_single_element(basic_url_in_queue, basic_urls)
-                if self.max_depth is None or depth < self.max_depth:
-                    self._add_urls_to_queue(UrlSet(urls), depth)
-            self._queue.task_done()
+        self._queue = deque()
+        self._enqueued = set()
+        logger.info('Start crawling from root URL: {}'.format(self.url.get_basic_url()))
+        self._enqueued.add(self.url.get_basic_url())
+        self._queue.append((self.url, 0))
+        runners = set()
+        while self._queue or runners:
+            while self._queue and len(runners) < self.max_runners:
+                runners.add(asyncio.create_task(self._process_url(*self._queue.popleft())))
+            done, runners = await asyncio.wait(runners, return_when=asyncio.FIRST_COMPLETED)
+            for runner in done:
+                if runner.exception() is not None:
+                    logger.error('Exception triggered when processing a url: {}'.format(runner.exception()))
+
+    async def _process_url(self, url_in_queue: Url, depth: int) -> None:
+        """
+        Processes a url taken from the queue, adding the urls found in its page to the queue
+        :param url_in_queue: the url to process
+        :param depth: the depth at which the url was found
+        :return: None
+        """
+        basic_url_in_queue = url_in_queue.get_basic_url()
+        basic_urls = Counter()
+        urls = UrlSet([])
+        for url in await self._get_urls(url_in_queue):
+            basic_url = url.get_basic_url()
+            if basic_url != basic_url_in_queue:
+                basic_urls[basic_url] += 1
+                urls.add(url)
+        self.crawled_urls[basic_url_in_queue] = basic_urls
+        if self.print_in_real_time:
+            print_single_element(basic_url_in_queue, basic_urls)
+        if self.max_depth is None or depth < self.max_depth:
+            self._add_urls_to_queue(urls, depth)
 
     def _add_urls_to_queue(self, urls: UrlSet, depth: int) -> None:
         """
         Adds the given urls to the queue to be processed as long as some conditions are met, which are:
-        the url has never been crawled in before, it has the same domain of the root URL defined when constructing the
+        the url has never been added to the queue before, it has the same domain of the root URL defined when constructing the
         object and the result of method url.is_crawlable() is True
         :param urls: the urls to add to the queue
         :param depth: the depth at which those urls were found
@@ -116,38 +165,46 @@ class Crawler:
         """
         for url in urls.values():
             basic_url = url.get_basic_url()
-            if url.domain == self.url.domain and basic_url not in self.crawled_urls.keys() and url.is_crawlable():
-                self._queue.put_nowait((url, depth + 1))
+            if basic_url not in self._enqueued and url.domain == self.url.domain and url.is_crawlable():
+                self._enqueued.add(basic_url)
+                self._queue.append((url, depth + 1))
 
     async def _get(self, url: str) -> str:
         """
-        Simply make an HTTP request to the given URL with a new session
+        Simply make an HTTP request to the given URL with the current session. The body of the response is read only
+        if its content type is HTML or XML, otherwise an empty string is returned
         :param url: the url of the website to send an HTTP request to
         :return: the HTML page in the response as a single string
         """
-        async with self._session.get(url) as r:
-            return await r.text()
+        async with self._session.get(url, headers=self.headers) as r:
+            content_type = r.headers.get(aiohttp.hdrs.CONTENT_TYPE, '').lower()
+            if content_type and 'html' not in content_type and 'xml' not in content_type:
+                return ''
+            body = await r.read()
+            try:
+                return body.decode(r.charset or 'utf-8', 'ignore')
+            except LookupError:
+                return body.decode('utf-8', 'ignore')
 
     async def _get_urls(self, url: Url, retries: int = 0) -> list:
         """
-        Calls the __get(url) method to make an HTTP Request and then processes the resulting HTML page and
-        returns a list of URLs found in the page. If the HTTP Request was not successful, it will call itself as many
-        times as variable self.max_retries indicates
+        Calls the __get(url) method to make an HTTP Request and then processes the resulting HTML page in a separate
+        thread, so that the event loop is not blocked, and returns a list of URLs found in the page. If the HTTP Request
+        was not successful, it will be retried as many times as variable self.max_retries indicates
         :param url: the url of the website to send an HTTP request to
-        :param retries: the number of retries that have been executed for the url
+        :param retries: the number of retries that have already been executed for the url
         :return: a list of URLs found in the page
         """
-        try:
-            if self._limit:
-                async with self._limit:
-                    text = await self._get(url.get_basic_url())
-            else:
+        while True:
+            try:
                 text = await self._get(url.get_basic_url())
-        except UnicodeDecodeError as unicode_decode_error:
-            logger.error('Cannot decode text from url: {}'.format(unicode_decode_error))
-            return []
-        except Exception as e:
-            if retries < self.max_retries:
+                break
+            except Exception as e:
+                if retries >= self.max_retries:
+                    logger.error(
+                        'Maximum retries reached for url {} because of exception {}, hence the url will not be processed'.format(
+                            url.get_basic_url(), e))
+                    return []
                 logger.warning(
                     'Exception triggered when requesting URL {}, will retry. Current retry: {} Exception is {}'.format(
                         url.get_basic_url(), str(retries),
@@ -155,13 +212,9 @@ class Crawler:
                 retries += 1
                 if self.sleep_between_retries > 0:
                     await asyncio.sleep(self.sleep_between_retries)
-                return await self._get_urls(url, retries)
-            else:
-                logger.error(
-                    'Maximum retries reached for url {} because of exception {}, hence the url will not be processed'.format(
-                        url.get_basic_url(), e))
-                return []
-        urls = self._get_urls_from_text(text, url)
+        urls = await asyncio.get_running_loop().run_in_executor(None, self._get_urls_from_text, text, url)
+        # The page is not needed anymore, so it is released before sleeping
+        del text
         if self.sleep_after_request > 0:
             await asyncio.sleep(self.sleep_after_request)
         return urls
@@ -174,19 +227,44 @@ class Crawler:
         :param html_text: the HTML page to get URLs from
         :return: the list of URLs found in the page
         """
-
-        soup = BeautifulSoup(html_text, 'html.parser')
-        links = soup.find_all('a')
-        urls = [Url(url, parent_url=parent_url, use_parent_protocol=self.assume_parent_protocol) for link in links if
-                (url := link.get('href')) is not None]
+        domain = self.url.domain if self.domain_filter else None
+        urls = Url.from_string_urls(self._filter_string_urls(self._get_hrefs(html_text)), parent_url=parent_url,
+                                    use_parent_protocol=self.assume_parent_protocol, domain=domain)
 
         if self.regex_search:
-            for match in re.finditer(self.url.default_regex, html_text):
-                url_to_append = Url(match.group(0), parent_url=parent_url,
-                                    use_parent_protocol=self.assume_parent_protocol)
-                if url_to_append.get_basic_url() not in UrlSet(urls).keys():
+            found_basic_urls = {url.get_basic_url() for url in urls}
+            matches = self._filter_string_urls(match.group(0) for match in self.url.default_regex.finditer(html_text))
+            for url_to_append in Url.from_string_urls(matches, parent_url=parent_url,
+                                                      use_parent_protocol=self.assume_parent_protocol, domain=domain):
+                basic_url = url_to_append.get_basic_url()
+                if basic_url not in found_basic_urls:
+                    found_basic_urls.add(basic_url)
                     urls.append(url_to_append)
-
-        if self.domain_filter:
-            urls = [url for url in urls if self.url.domain == url.domain]
         return urls
+
+    def _filter_string_urls(self, string_urls: Iterable[str]) -> Iterable[str]:
+        """
+        If self.domain_filter is True, it filters out the absolute urls whose domain is clearly different from the
+        domain of the root url, so that no Url object is created for them. Relative urls are always kept
+        :param string_urls: the urls as strings
+        :return: the filtered urls as strings
+        """
+        if not self.domain_filter:
+            return string_urls
+        return [string_url for string_url in string_urls if not self._foreign_url_regex.match(string_url)]
+
+    def _get_hrefs(self, html_text: str) -> list:
+        """
+        Gets the values of the href attributes of all "a" tags present in the given HTML page. If self.use_html_parser
+        is True, the page is parsed with BeautifulSoup. Otherwise, the attributes are found with a regex
+        :param html_text: the HTML page to get the href values from
+        :return: the list of href values found in the page
+        """
+        if self.use_html_parser:
+            soup = BeautifulSoup(html_text, 'lxml')
+            hrefs = [href for link in soup.find_all('a') if (href := link.get('href')) is not None]
+            soup.decompose()
+            return hrefs
+        hrefs = [match.group(match.lastindex) for match in self._href_regex.finditer(html_text)
+                 if match.lastindex is not None and match.lastindex > 1]
+        return [html.unescape(href) if '&' in href else href for href in hrefs]
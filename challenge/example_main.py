@@ -20,6 +20,11 @@ if __name__ == '__main__':
         loop = asyncio.get_event_loop()
         loop.run_until_complete(main(url))
     else:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
         asyncio.run(main(url))
     end_time = datetime.now()
     print('Time spent crawling: ' + str(end_time - start_time))
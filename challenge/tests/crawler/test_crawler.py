@@ -1,5 +1,8 @@
+import aiohttp
 import mockito
+from collections import Counter
 from challenge.crawler.crawler import Crawler
+from challenge.utils.url_utils import Url
 from unittest import IsolatedAsyncioTestCase
 from pathlib import Path
 
@@ -19,12 +22,14 @@ class CrawlerTest(IsolatedAsyncioTestCase):
         assume_parent_protocol = False
         sleep_after_request = 3.3
         concurrent_requests_limit = 5
+        use_html_parser = True
         complete_crawler = Crawler(site, headers=headers, regex_search=regex_search, domain_filter=domain_filter,
                                    max_runners=max_runners, print_in_real_time=print_in_real_time,
                                    max_retries=max_retries, sleep_between_retries=sleep_between_retries,
                                    max_depth=max_depth, assume_parent_protocol=assume_parent_protocol,
                                    sleep_after_request=sleep_after_request,
-                                   concurrent_requests_limit=concurrent_requests_limit)
+                                   concurrent_requests_limit=concurrent_requests_limit,
+                                   use_html_parser=use_html_parser)
         self.assertEqual(complete_crawler.url.string_url, site)
         self.assertEqual(complete_crawler.headers, headers)
         self.assertEqual(complete_crawler.domain_filter, domain_filter)
@@ -36,6 +41,7 @@ class CrawlerTest(IsolatedAsyncioTestCase):
         self.assertEqual(complete_crawler.assume_parent_protocol, assume_parent_protocol)
         self.assertEqual(complete_crawler.sleep_after_request, sleep_after_request)
         self.assertEqual(complete_crawler.concurrent_requests_limit, concurrent_requests_limit)
+        self.assertEqual(complete_crawler.use_html_parser, use_html_parser)
 
         crawler = Crawler(site, max_runners=-3, max_retries=-3, sleep_between_retries=-3, max_depth=-3,
                           concurrent_requests_limit=-3)
@@ -45,6 +51,42 @@ class CrawlerTest(IsolatedAsyncioTestCase):
         self.assertEqual(crawler.max_depth, 0)
         self.assertEqual(crawler.concurrent_requests_limit, None)
 
+    def test_filter_string_urls(self):
+        """
+        Tests that absolute urls with a different domain are filtered out before creating Url objects when the domain
+        filter is enabled, while relative urls and urls with the same domain are kept
+        """
+        string_urls = ['https://mysite.com/test', '//www.mysite.com', 'rel_link', '#section_link', '///about',
+                       'https:///about', '//', '//www./about', 'https://mysite.com\n/contact', 'https://\nmysite.com/x',
+                       'https://anothersite.com', '//anothersite.com/test', 'https://mysite.com.anothersite.com', 'https://mysite.com:8080']
+        crawler = Crawler('https://mysite.com')
+        self.assertEqual(crawler._filter_string_urls(string_urls), string_urls[:10])
+        # The urls kept only because their domain cannot be ruled out by the regex are still kept by the exact filter
+        self.assertEqual([url.get_basic_url() for url in Url.from_string_urls(string_urls[4:10], parent_url=crawler.url,
+                                                                              domain=crawler.url.domain)],
+                         ['https://mysite.com/about', 'https://mysite.com/about', 'https://mysite.com',
+                          'https://mysite.com/about', 'https://mysite.com/contact', 'https://mysite.com/x'])
+        crawler = Crawler('https://mysite.com', domain_filter=False)
+        self.assertEqual(crawler._filter_string_urls(string_urls), string_urls)
+
+    def test_get_hrefs(self):
+        """
+        Tests that the href values found with the default regex are the same as the ones found by parsing the page with
+        BeautifulSoup, ignoring links inside comments, scripts and other attributes' values
+        """
+        html_texts = ['<a href="/a"><!-- <a href="/commented"> --><script>\'<a href="/in-script">\'</script>',
+                      '<a title="x href=/bad" href="/good">', '<a data-href="/no" href="/yes">',
+                      '<a href="/first" href="/second">', '<style>a{}<a href="/in-style"></style><a href=/after>',
+                      '<A HREF = \'/upper\' >', '<a title="a>b"href="/no-space">', '<a\nhref="/a?b=1&amp;c=2">',
+                      '<abbr href="/abbr">', '<a title=x"href=/bad" href=/good>', '<!-- unterminated <a href="/a">',
+                      '<a href="">']
+        crawler = Crawler('https://mysite.com')
+        parser_crawler = Crawler('https://mysite.com', use_html_parser=True)
+        for html_text in html_texts:
+            self.assertEqual(crawler._get_hrefs(html_text), parser_crawler._get_hrefs(html_text))
+        self.assertEqual(crawler._get_hrefs(''.join(html_texts)),
+                         ['/a', '/good', '/yes', '/first', '/after', '/upper', '/no-space', '/a?b=1&c=2', '/good'])
+
     async def test_crawl(self):
         """
         Tests that crawling working as expected, including multiple edge cases. Mockito and multiple HTML example
@@ -55,21 +97,27 @@ class CrawlerTest(IsolatedAsyncioTestCase):
         crawler = Crawler(site, max_runners=10)
         spy(site)
         crawled_urls = await crawler.crawl()
-        self.assertEqual(crawled_urls, get_first_expected_crawl_results())
+        self.assertEqual(crawled_urls, to_counters(get_first_expected_crawl_results()))
+
+        # Verify that parsing the pages with BeautifulSoup gives the same results as the default regex href search
+        crawler = Crawler(site, max_runners=10, use_html_parser=True)
+        spy(site)
+        crawled_urls = await crawler.crawl()
+        self.assertEqual(crawled_urls, to_counters(get_first_expected_crawl_results()))
 
         # Now use set the domain filter to false and verify that the results include URLs with a different domain than
         # the root site
         crawler = Crawler(site, max_runners=10, domain_filter=False)
         spy(site)
         crawled_urls = await crawler.crawl()
-        self.assertEqual(crawled_urls, get_second_expected_crawl_results())
+        self.assertEqual(crawled_urls, to_counters(get_second_expected_crawl_results()))
 
         # Now set the depth to 0 and verify that the result is as expected
         crawler = Crawler(site, max_runners=10, max_depth=0)
         spy(site)
         crawled_urls = await crawler.crawl()
         self.assertEqual(len(crawled_urls), 1)
-        self.assertEqual(crawled_urls[site], get_first_expected_crawl_results()[site])
+        self.assertEqual(crawled_urls[site], Counter(get_first_expected_crawl_results()[site]))
 
         # Now enable regex search and verify that urls outside hrefs are added to the result.
         # It also verifies that links to .jpg, .png and .pdf contents are not considered crawlable
@@ -77,7 +125,7 @@ class CrawlerTest(IsolatedAsyncioTestCase):
         crawler = Crawler(site, max_runners=10, regex_search=True)
         spy(site)
         crawled_urls = await crawler.crawl()
-        self.assertEqual(crawled_urls, get_third_crawled_results())
+        self.assertEqual(crawled_urls, to_counters(get_third_crawled_results()))
 
         # Verify that if assume_parent_protocol is set to False, then http links will be seen as different
         # from https links with the same domain and path. It also verifies that http://mysite.com/rel_link is not found
@@ -87,7 +135,108 @@ class CrawlerTest(IsolatedAsyncioTestCase):
         spy(site)
         crawled_urls = await crawler.crawl()
         mockito.verify(Crawler, times=2)._get(mockito.eq('http://mysite.com/rel_link'))
-        self.assertEqual(crawled_urls, get_fourth_crawled_results())
+        self.assertEqual(crawled_urls, to_counters(get_fourth_crawled_results()))
+
+    async def test_crawl_with_session(self):
+        """
+        Tests that a given session is used for crawling and that it is not closed at the end of the crawling
+        """
+        site = 'https://mysite.com'
+        session = mockito.mock(aiohttp.ClientSession)
+        crawler = Crawler(site, max_runners=10, session=session)
+        self.assertIs(crawler.session, session)
+        spy(site)
+        crawled_urls = await crawler.crawl()
+        self.assertEqual(crawled_urls, to_counters(get_first_expected_crawl_results()))
+        self.assertIs(crawler._session, session)
+        mockito.verify(session, times=0).close()
+
+    async def test_crawl_connector_limit(self):
+        """
+        Tests that concurrent_requests_limit is used as the limit of the connector of the session created by the
+        crawler, and that the connector defaults to 100 connections when it is not given
+        """
+        site = 'https://mysite.com'
+        tcp_connector = aiohttp.TCPConnector
+        for concurrent_requests_limit, limit in ((5, 5), (None, 100)):
+            mockito.when(aiohttp).TCPConnector(limit=limit, ttl_dns_cache=300, keepalive_timeout=30).thenAnswer(
+                lambda **kwargs: tcp_connector(**kwargs))
+            crawler = Crawler(site, max_runners=10, concurrent_requests_limit=concurrent_requests_limit)
+            spy(site)
+            await crawler.crawl()
+            mockito.verify(aiohttp, times=1).TCPConnector(limit=limit, ttl_dns_cache=300, keepalive_timeout=30)
+            mockito.unstub(aiohttp)
+
+    async def test_get(self):
+        """
+        Tests that the body of a response is decoded with the charset of its Content-Type, falling back to UTF-8 when
+        the charset is missing or unknown, and that the body of a response that is not HTML is not read
+        """
+        mockito.unstub()
+        site = 'https://mysite.com'
+        crawler = Crawler(site)
+        crawler._session = mockito.mock()
+        text = '<a href="/café">café</a>'
+        responses = [(MockResponse(text.encode('latin-1'), 'text/html; charset=latin-1', 'latin-1'), text),
+                     (MockResponse(text.encode(), 'image/png'), ''),
+                     (MockResponse(text.encode()), text),
+                     (MockResponse(text.encode(), 'text/html; charset=unknown', 'unknown'), text)]
+        for response, expected_text in responses:
+            mockito.when(crawler._session).get(site, headers=crawler.headers).thenReturn(response)
+            self.assertEqual(await crawler._get(site), expected_text)
+            self.assertEqual(response.read_count, 1 if expected_text else 0)
+        mockito.unstub()
+
+    async def test_urls_requested_once(self):
+        """
+        Tests that urls found multiple times across the crawled pages are only added to the queue, and hence
+        requested, once
+        """
+        mockito.unstub()
+        site = 'https://mysite.com'
+        crawler = Crawler(site, max_runners=10)
+        spy(site)
+        await crawler.crawl()
+        for crawled_url in get_first_expected_crawl_results().keys():
+            mockito.verify(Crawler, times=1)._get(mockito.eq(crawled_url))
+        mockito.unstub()
+
+    async def test_crawl_twice(self):
+        """
+        Tests that crawling again with the same crawler requests all the urls again and gives the same results
+        """
+        mockito.unstub()
+        site = 'https://mysite.com'
+        crawler = Crawler(site, max_runners=10)
+        for _ in range(2):
+            spy(site)
+            crawled_urls = await crawler.crawl()
+            self.assertEqual(crawled_urls, to_counters(get_first_expected_crawl_results()))
+        for crawled_url in get_first_expected_crawl_results().keys():
+            mockito.verify(Crawler, times=2)._get(mockito.eq(crawled_url))
+        mockito.unstub()
+
+
+class MockResponse:
+    """
+    Minimal stand-in for an aiohttp response, usable as the async context manager returned by session.get()
+    """
+
+    def __init__(self, body: bytes, content_type: str = None, charset: str = None):
+        self.body = body
+        self.headers = {aiohttp.hdrs.CONTENT_TYPE: content_type} if content_type else {}
+        self.charset = charset
+        self.read_count = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def read(self) -> bytes:
+        self.read_count += 1
+        return self.body
 
 
 async def read_file(path) -> str:
@@ -118,6 +267,10 @@ def spy(site):
     mockito.when(Crawler)._get(mockito.eq('https://mysite.com/simple-https-link/rel_link')).thenReturn(empty_file())
 
 
+def to_counters(crawl_results: dict) -> dict:
+    return {url: Counter(urls) for url, urls in crawl_results.items()}
+
+
 def get_first_expected_crawl_results() -> dict:
     return {
         'https://mysite.com': ['https://mysite.com/simple-https-link', 'https://mysite.com/rel_link',
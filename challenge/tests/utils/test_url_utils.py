@@ -1,6 +1,5 @@
 import unittest
 import mockito
-from re import Pattern
 from challenge.utils import url_utils
 from challenge.utils.url_utils import Url, UrlSet
 
@@ -76,6 +75,33 @@ class UrlUtilsTest(unittest.TestCase):
         self.assertEqual(url.get_basic_url(), 'http://mysite.com')
         self.assertEqual(url.get_full_url(), 'http://www.mysite.com')
 
+    def test_get_urls_cached(self):
+        """
+        Tests that the basic and full urls are computed only once per Url object and that equal basic urls are interned
+        """
+        url = Url('./test2', parent_url=Url('http://www.mysite.com/test'))
+        basic_url = url.get_basic_url()
+        self.assertEqual(basic_url, 'http://mysite.com/test/test2')
+        self.assertIs(url.get_basic_url(), basic_url)
+        self.assertIs(Url('http://mysite.com/test/test2').get_basic_url(), basic_url)
+        full_url = url.get_full_url()
+        self.assertEqual(full_url, 'http://www.mysite.com/test/test2')
+        self.assertIs(url.get_full_url(), full_url)
+
+    def test_from_string_urls(self):
+        """
+        Tests that Urls created from a list of strings are the same as the ones created one by one and that
+        repeated strings are parsed only once
+        """
+        parent_url = Url('http://www.mysite.com/test')
+        string_urls = ['./test2', '#fragment', './test2', 'https://anothersite.com/path']
+        urls = Url.from_string_urls(string_urls, parent_url=parent_url)
+        self.assertEqual([url.get_full_url() for url in urls],
+                         [Url(string_url, parent_url=parent_url).get_full_url() for string_url in string_urls])
+        self.assertIs(urls[0], urls[2])
+        urls = Url.from_string_urls(string_urls, parent_url=parent_url, domain='anothersite.com')
+        self.assertEqual([url.get_full_url() for url in urls], ['https://anothersite.com/path'])
+
     def test_is_valid_url(self):
         """
         Tests that urls are correctly seen as valid or invalid
@@ -86,22 +112,39 @@ class UrlUtilsTest(unittest.TestCase):
         for invalid_url in self.invalid_urls:
             self.assertFalse(Url(invalid_url).is_valid())
 
+        self.assertTrue(Url('https://mysite.com/test').is_valid('https://mysite\\.com/.*'))
+        self.assertFalse(Url('https://mysite.com/test').is_valid('https://mysite\\.com'))
+        self.assertTrue(Url('http://ab').is_valid('http://.*'))
+        self.assertFalse(Url('http://ab').is_valid())
+
     def test_is_url_crawlable(self):
         """
         Tests that urls are considered crawlable when they represent a valid url and do not represent
         a pdf, png or jpg
         """
-        ## Mock so that is_valid_url always returns true (as it is already tested in another test)
-        # and we just verify that it is called the correct number of times
-        mockito.expect(Url, times=len(self.valid_urls) + 3).is_valid(mockito.any(Pattern)).thenReturn(True)
+        for valid_url in self.valid_urls:
+            self.assertTrue(Url(valid_url).is_crawlable())
+
+        for invalid_url in self.invalid_urls:
+            self.assertFalse(Url(invalid_url).is_crawlable())
+
+        self.assertFalse(Url('https://mysite.com/content.jpg').is_crawlable())
+        self.assertFalse(Url('https://mysite.com/content.pdf').is_crawlable())
+        self.assertFalse(Url('https://mysite.com/content.png').is_crawlable())
+
+        ## When a regex is given, mock so that is_valid_url always returns true (as it is already tested in another test)
+        # and we just verify that it is called the correct number of times, which excludes the content urls
+        regex = Url('https://mysite.com').default_regex
+        mockito.expect(Url, times=len(self.valid_urls)).is_valid(regex).thenReturn(True)
 
         for valid_url in self.valid_urls:
-            self.assertTrue(mockito.spy(Url(valid_url)).is_crawlable())
+            self.assertTrue(Url(valid_url).is_crawlable(regex))
 
-        self.assertFalse(mockito.spy(Url('https://mysite.com/content.jpg')).is_crawlable())
-        self.assertFalse(mockito.spy(Url('https://mysite.com/content.pdf')).is_crawlable())
-        self.assertFalse(mockito.spy(Url('https://mysite.com/content.png')).is_crawlable())
+        self.assertFalse(Url('https://mysite.com/content.jpg').is_crawlable(regex))
+        self.assertFalse(Url('https://mysite.com/content.pdf').is_crawlable(regex))
+        self.assertFalse(Url('https://mysite.com/content.png').is_crawlable(regex))
 
+        mockito.verifyNoUnwantedInteractions()
         mockito.unstub()
 
     def test_get_url_info(self):
@@ -122,6 +165,36 @@ class UrlUtilsTest(unittest.TestCase):
 
         url = 'https://www.this.that.here/path/#fragment'
         self.assertEqual(url_utils.get_url_info(url), ('https', True, 'this.that.here', '/path/', 'fragment'))
+        self.assertIs(url_utils.get_url_info(url)[2], url_utils.get_url_info('//this.that.here')[2])
+
+    def test_split_url(self):
+        """
+        Tests that urls are split in the same way as urllib.parse.urlparse does in Python 3.8
+        """
+        split_urls = {
+            'https://www.this.that.here/path/#fragment': ('https', 'www.this.that.here', '/path/', '', 'fragment'),
+            'HTTP://mysite.com:8080/path;params?query#fragment': ('http', 'mysite.com:8080', '/path', 'query',
+                                                                  'fragment'),
+            '//mysite.com': ('', 'mysite.com', '', '', ''),
+            '/path/to;params/here': ('', '', '/path/to;params/here', '', ''),
+            './rel_link': ('', '', './rel_link', '', ''),
+            '#fragment': ('', '', '', '', 'fragment'),
+            '?query': ('', '', '', 'query', ''),
+            'mailto:me@mysite.com': ('mailto', '', 'me@mysite.com', '', ''),
+            'javascript:void(0)': ('javascript', '', 'void(0)', '', ''),
+            ' https://mysite.com/ ': ('https', 'mysite.com', '/ ', '', ''),
+            'https://mysite\n.com/pa\tth': ('https', 'mysite.com', '/path', '', ''),
+            '': ('', '', '', '', ''),
+            'path:80': ('', '', 'path:80', '', ''),
+            'page:2': ('', '', 'page:2', '', ''),
+            'http:80': ('http', '', '80', '', ''),
+            'about:': ('about', '', '', '', ''),
+        }
+        for url, split_url in split_urls.items():
+            self.assertEqual(url_utils.split_url(url), split_url)
+
+        url = Url('page:2', parent_url=Url('https://mysite.com/blog'))
+        self.assertEqual(url.get_basic_url(), 'https://mysite.com/blog/page:2')
 
     def test_remove_consecutive_slashes(self):
         """
@@ -131,10 +204,25 @@ class UrlUtilsTest(unittest.TestCase):
         self.assertEqual(url_utils.remove_consecutive_slashes('////'), '/')
         self.assertEqual(url_utils.remove_consecutive_slashes('mysite.com/this//that'), 'mysite.com/this/that')
         self.assertEqual(url_utils.remove_consecutive_slashes('mysite.com///this/that'), 'mysite.com/this/that')
+        self.assertEqual(url_utils.remove_consecutive_slashes('mysite.com/this/that'), 'mysite.com/this/that')
+
+    def test_refactor_ending(self):
+        """
+        Tests that consecutive slashes and the ending slash are removed from a path or fragment
+        """
+        self.assertEqual(url_utils.refactor_ending('/'), '')
+        self.assertEqual(url_utils.refactor_ending('///'), '')
+        self.assertEqual(url_utils.refactor_ending('/this//that/'), '/this/that')
+        self.assertEqual(url_utils.refactor_ending('/this/that'), '/this/that')
 
     def test_url_set(self):
         url_set = UrlSet([Url(url) for url in self.valid_urls])
         self.assertEqual(len(url_set.values()), 4)
+        first_url = Url('https://mysite.com/other')
+        url_set.add(first_url)
+        url_set.add(Url('https://www.mysite.com/other'))
+        self.assertEqual(len(url_set.values()), 5)
+        self.assertIn(first_url, url_set.values())
 
 
 if __name__ == '__main__':
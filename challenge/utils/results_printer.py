@@ -1,16 +1,17 @@
 from collections import Counter
-from typing import Union
+from typing import Mapping, Union
 
 
-def print_single_element(parent_url: str, urls: Union[list, set]) -> None:
+def print_single_element(parent_url: str, urls: Union[list, set, Mapping]) -> None:
     """
-    Prints a single crawling result given a parent_url and a list or set of urls
+    Prints a single crawling result given a parent_url and a list or set of urls, or a mapping of urls to the number of
+    times they were found
     :param parent_url: the parent_url
-    :param urls: the list or set of Urls
+    :param urls: the list or set of Urls, or the mapping of Urls to their count
     :return: None
     """
-    counter = dict(Counter(urls))
-    urls_to_print = {url + ' (' + str(counter.get(url)) + ')' for url in urls}
+    counter = urls if isinstance(urls, Mapping) else Counter(urls)
+    urls_to_print = {url + ' (' + str(count) + ')' for url, count in counter.items()}
     print("The urls present in " + parent_url + " are: " + ', '.join(urls_to_print))
 
 
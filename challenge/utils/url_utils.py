@@ -1,22 +1,68 @@
 import re
-from re import Pattern
-from typing import Union
-from urllib.parse import urlparse
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, KeysView, List, Optional, Pattern, Tuple, Union, ValuesView
+from urllib.parse import uses_params
 
+_consecutive_slashes_regex = re.compile('/{2,}')
+_scheme_regex = re.compile('[a-zA-Z0-9+.-]+')
+_url_leading_chars_to_strip = ''.join(chr(i) for i in range(33))
+_default_url_regex = re.compile(r'(https?)://(www\.)?[A-Za-z0-9@:%._+~#?&/=]{2,256}\.[a-z]{2,6}\b[-A-Za-z0-9@:%._+~#?&/=]*')
+_content_suffixes = ('.png', '.pdf', '.jpg', '.jpeg', '.txt')
+_crawlable_url_regex = re.compile(
+    _default_url_regex.pattern + ''.join('(?<!' + re.escape(suffix) + ')' for suffix in _content_suffixes))
 
-def get_url_info(url: str) -> tuple:
+
+@lru_cache(maxsize=8192)
+def get_url_info(url: str) -> Tuple[str, bool, str, str, str]:
     """
-    Gets the protocol and the domain without www. from the url and returns a tuple of them
+    Gets the protocol and the domain without www. from the url and returns a tuple of them.
+    The protocol and the domain are interned and the results for the most recently used urls are cached
     :param url: the url to process
     :return: a tuple (protocol, hostname)
     """
-    parsed_url = urlparse(url)
-    scheme = parsed_url.scheme
-    netloc = parsed_url.netloc
-    path = parsed_url.path if parsed_url.query == '' else parsed_url.path + '?' + parsed_url.query
-    fragment = parsed_url.fragment
-    www_subdomain = True if netloc.startswith('www.') else False
-    return scheme, www_subdomain, netloc[4::] if netloc.startswith('www.') else netloc, path, fragment
+    scheme, netloc, path, query, fragment = split_url(url)
+    path = path if query == '' else path + '?' + query
+    www_subdomain = netloc.startswith('www.')
+    if www_subdomain:
+        netloc = netloc[4:]
+    return sys.intern(scheme), www_subdomain, sys.intern(netloc), path, fragment
+
+
+def split_url(url: str) -> Tuple[str, str, str, str, str]:
+    """
+    Splits the url in its scheme, netloc, path, query and fragment in the same way as urllib.parse.urlparse does in
+    Python 3.8, dropping the parameters of the last path segment, but without building a ParseResult and without
+    validating the netloc
+    :param url: the url to split
+    :return: a tuple (scheme, netloc, path, query, fragment)
+    """
+    url = url.lstrip(_url_leading_chars_to_strip)
+    if '\t' in url or '\r' in url or '\n' in url:
+        url = url.replace('\t', '').replace('\r', '').replace('\n', '')
+    scheme = netloc = query = fragment = ''
+    colon = url.find(':')
+    if colon > 0 and _scheme_regex.fullmatch(url, 0, colon):
+        rest = url[colon + 1:]
+        # Like urlparse in Python 3.8, a url such as 'path:80' has no scheme, as what follows the colon may be a port
+        if url[:colon] == 'http' or not rest or rest.strip('0123456789'):
+            scheme, url = url[:colon].lower(), rest
+    if url.startswith('//'):
+        netloc_end = len(url)
+        for delimiter in '/?#':
+            delimiter_index = url.find(delimiter, 2)
+            if 0 <= delimiter_index < netloc_end:
+                netloc_end = delimiter_index
+        netloc, url = url[2:netloc_end], url[netloc_end:]
+    if '#' in url:
+        url, fragment = url.split('#', 1)
+    if '?' in url:
+        url, query = url.split('?', 1)
+    if scheme in uses_params and ';' in url:
+        params_start = url.find(';', max(url.rfind('/'), 0))
+        if params_start >= 0:
+            url = url[:params_start]
+    return scheme, netloc, url, query, fragment
 
 
 def remove_consecutive_slashes(basic_url: str) -> str:
@@ -25,12 +71,21 @@ def remove_consecutive_slashes(basic_url: str) -> str:
     :param basic_url: the url without the protocol, so without e.g. https:// or http://
     :return: the url without duplicated slashes
     """
-    previous_url = basic_url
-    formatted_url = previous_url.replace('//', '/')
-    while formatted_url != previous_url:
-        previous_url = formatted_url
-        formatted_url = previous_url.replace('//', '/')
-    return formatted_url
+    if '//' not in basic_url:
+        return basic_url
+    return _consecutive_slashes_regex.sub('/', basic_url)
+
+
+def refactor_ending(text: str) -> str:
+    """
+    Refactors a path or fragment of a URL by deleting incorrect consecutive slashes and the ending slash, if there is one
+    :param text: the path or fragment
+    :return: the refactored path or fragment
+    """
+    text = remove_consecutive_slashes(text)
+    if text == '/':
+        return ''
+    return text[:-1] if text.endswith('/') else text
 
 
 class Url:
@@ -38,91 +93,151 @@ class Url:
     Class to be used by the crawler to manipulate URLs
     """
 
-    _default_regex = re.compile(("((http|https)://)(www.)?" +
-                                 "[a-zA-Z0-9@:%._\\+~#?&//=]" +
-                                 "{2,256}\\.[a-z]" +
-                                 "{2,6}\\b([-a-zA-Z0-9@:%" +
-                                 "._\\+~#?&//=]*)"))
+    __slots__ = ['string_url', 'protocol', 'www', 'domain', 'path', 'fragment', 'use_parent_protocol', '_parent',
+                 '_effective_protocol', '_basic_url', '_full_url']
 
-    __slots__ = ['string_url', 'parent_protocol', 'parent_www', 'parent_domain', 'parent_path', 'protocol', 'www',
-                 'domain', 'path',
-                 'fragment', 'use_parent_protocol']
-
-    def __init__(self, url: str, parent_url: 'Url' = None, use_parent_protocol: bool = True):
+    def __init__(self, url: str, parent_url: Optional['Url'] = None, use_parent_protocol: bool = True):
         """
         :param url: the url
         :param root_url: the root url. It's the URL from which the crawling process started
         :param use_parent_protocol: if True, the protocol from the parent will always be used if the parent domain is the same as
                                   the url domain
         """
-        self._fill_parent_attributes(parent_url)
+        self._basic_url: Optional[str] = None
+        self._full_url: Optional[str] = None
+        self._parent = parent_url
         self.string_url = url
         self.protocol, self.www, self.domain, self.path, self.fragment = get_url_info(url)
-        self._refactor_attributes()
-        self._refactor_root_attributes()
+        self._refactor_attributes(parent_url)
+        self.use_parent_protocol: bool
         if parent_url and use_parent_protocol:
             self.use_parent_protocol = parent_url.use_parent_protocol
         else:
             self.use_parent_protocol = use_parent_protocol
+        uses_parent_protocol = self.use_parent_protocol and self.domain == self.parent_domain and (
+                self.protocol == '' or self.protocol.startswith('http'))
+        self._effective_protocol = self.parent_protocol if uses_parent_protocol else self.protocol
+
+    @classmethod
+    def from_string_urls(cls, string_urls: Iterable[str], parent_url: Optional['Url'] = None,
+                         use_parent_protocol: bool = True, domain: Optional[str] = None) -> List['Url']:
+        """
+        Creates the Urls for the given strings, all found in the same parent url. A string that appears multiple times is
+        parsed only once, and the same Url object is repeated in the returned list
+        :param string_urls: the urls as strings
+        :param parent_url: the parent url of all the given urls
+        :param use_parent_protocol: if True, the protocol from the parent will always be used if the parent domain is the same as
+                                  the url domain
+        :param domain: if not None, only the Urls with this domain are returned
+        :return: the list of Urls, in the same order as the given strings
+        """
+        created_urls: Dict[str, 'Url'] = {}
+        urls: List['Url'] = []
+        for string_url in string_urls:
+            url = created_urls.get(string_url)
+            if url is None:
+                url = created_urls[string_url] = cls(string_url, parent_url=parent_url,
+                                                     use_parent_protocol=use_parent_protocol)
+            if domain is None or url.domain == domain:
+                urls.append(url)
+        return urls
 
     def get_full_url(self) -> str:
         """
-        Returns the full correctly formatted URL
+        Returns the full correctly formatted URL. The result is computed only once and then cached on the object
         :return: the full URL
         """
-        www = 'www.' if self.www else ''
-        fragment = '/#' + self.fragment if self.fragment else ''
-        return self._get_protocol() + '://' + www + self.domain + self.path + fragment
+        if self._full_url is None:
+            www = 'www.' if self.www else ''
+            fragment = '/#' + self.fragment if self.fragment else ''
+            self._full_url = self._get_protocol() + '://' + www + self.domain + self.path + fragment
+        return self._full_url
 
     def get_basic_url(self) -> str:
         """
         Returns a "basic" form of the url, with just the protocol, domain and path, if the protocol is http
-        Otherwise, it will return exact representation of the string found for the url
+        Otherwise, it will return exact representation of the string found for the url.
+        The result is computed only once, interned and then cached on the object
         :return: a basic form of the url
         """
-        protocol = self._get_protocol()
-        if protocol.startswith('http'):
-            return self._get_protocol() + '://' + self.domain + self.path
-        else:
-            return self.string_url
+        if self._basic_url is None:
+            protocol = self._get_protocol()
+            if protocol.startswith('http'):
+                self._basic_url = sys.intern(protocol + '://' + self.domain + self.path)
+            else:
+                self._basic_url = sys.intern(self.string_url)
+        return self._basic_url
 
-    def is_valid(self, regex: Union[str, Pattern] = None) -> bool:
+    def is_valid(self, regex: Union[str, Pattern[str], None] = None) -> bool:
         """
-        Checks whether the given url is a syntactically valid url or not using a regex expression
+        Checks whether the given url is a syntactically valid url or not using a regex expression. The cheaper checks
+        are done first, so that the regex is used only when needed
 
         :param regex: the regular expression to use
         :return: True if the url is valid, False if not
         """
-        if regex is None:
-            regex = self._default_regex
         basic_url = self.get_basic_url()
-        return basic_url.startswith('http') and '/../' not in basic_url and re.fullmatch(regex, basic_url) is not None
+        if not basic_url.startswith('http') or '/../' in basic_url:
+            return False
+        if regex is None:
+            # The default regex matches nothing shorter than 'http://ab.cd'
+            return len(basic_url) >= 10 and _default_url_regex.fullmatch(basic_url) is not None
+        return re.compile(regex).fullmatch(basic_url) is not None
 
-    def is_crawlable(self, regex: Union[str, Pattern] = None) -> bool:
+    def is_crawlable(self, regex: Union[str, Pattern[str], None] = None) -> bool:
         """
-        Identifies whether the given url is "crawlable" by verifying that the url is valid based on the given or default
-        regex and that the url does not represent a .png, .jpg or .pdf file
+        Identifies whether the given url is "crawlable" by verifying that the url does not represent a .png, .jpg or .pdf
+        file and that the url is valid based on the given or default regex. The validity is checked only if the url is
+        not a content url, as it is the more expensive check. With the default regex, both checks are done by a single
+        regex matching
         :param regex: the regex expression to use to check whether the given url is valid
         :return: True if the url is considered "crawlable", False if not
         """
         if regex is None:
-            regex = self._default_regex
-        return self.is_valid(regex) and not self._is_content_url()
+            basic_url = self.get_basic_url()
+            return '/../' not in basic_url and _crawlable_url_regex.fullmatch(basic_url) is not None
+        return not self._is_content_url() and self.is_valid(regex)
+
+    @property
+    def parent_protocol(self) -> str:
+        """
+        :return: the protocol of the parent URL, or the protocol of this URL if it has no parent or the parent has no protocol
+        """
+        return (self._parent.protocol if self._parent is not None else '') or self.protocol
+
+    @property
+    def parent_www(self) -> bool:
+        """
+        :return: True if the parent URL has the www subdomain, or if this URL has it and it has no parent
+        """
+        return self._parent.www if self._parent is not None else self.www
+
+    @property
+    def parent_domain(self) -> str:
+        """
+        :return: the domain of the parent URL, or the domain of this URL if it has no parent or the parent has no domain
+        """
+        return (self._parent.domain if self._parent is not None else '') or self.domain
 
     @property
-    def default_regex(self):
-        return self._default_regex
+    def parent_path(self) -> str:
+        """
+        :return: the path of the parent URL, or an empty string if it has no parent
+        """
+        return self._parent.path if self._parent is not None else ''
+
+    @property
+    def default_regex(self) -> Pattern[str]:
+        return _default_url_regex
 
     def _is_content_url(self) -> bool:
         """
         Checks whether the URL represents a png, pdf, jpg, jpeg, txt or xml content
         :return: True if the URL represents a png, pdf, jpg, jpeg, txt or xml content, False otherwise
         """
-        basic_url = self.get_basic_url()
-        return basic_url.endswith('.png') or basic_url.endswith('.pdf') or basic_url.endswith(
-            '.jpg') or basic_url.endswith('.jpeg') or basic_url.endswith('.txt')
+        return self.get_basic_url().endswith(_content_suffixes)
 
-    def is_xml(self):
+    def is_xml(self) -> bool:
         """
         :return: True if the URL represents an XML, returns False otherwise
         """
@@ -130,81 +245,51 @@ class Url:
 
     def _refactor_ending(self) -> None:
         """
-        Refactors the path and/or fragment by deleting incorrect consecutive slashes and the ending slash, if there is one
+        Refactors the path and/or fragment by deleting incorrect consecutive slashes and the ending slash, if there is one.
+        Paths and fragments that are already clean are left untouched without calling refactor_ending
         :return: None
         """
+        if self.path.endswith('/') or '//' in self.path:
+            self.path = refactor_ending(self.path)
+        if self.fragment.endswith('/') or '//' in self.fragment:
+            self.fragment = refactor_ending(self.fragment)
 
-        def refactor(text: str) -> str:
-            refactored_text = text
-            if '//' in refactored_text:
-                refactored_text = remove_consecutive_slashes(refactored_text)
-            if refactored_text == '/':
-                refactored_text = ''
-            if refactored_text.endswith('/'):
-                refactored_text = refactored_text[:-1]
-            return refactored_text
-
-        if self.path:
-            self.path = refactor(self.path)
-        if self.fragment:
-            self.fragment = refactor(self.fragment)
-
-    def _fill_parent_attributes(self, parent_url: 'Url') -> None:
+    def _refactor_attributes(self, parent_url: Optional['Url']) -> None:
         """
-        Fills the parent attribute, given the parent URL
+        Refactors the attributes if needed
         :param parent_url: the parent URL
         :return: None
         """
         if parent_url is not None:
-            self.parent_protocol = parent_url.protocol
-            self.parent_www = parent_url.www
-            self.parent_domain = parent_url.domain
-            self.parent_path = parent_url.path
+            parent_protocol, parent_www, parent_domain, parent_path = (parent_url.protocol, parent_url.www,
+                                                                       parent_url.domain, parent_url.path)
         else:
-            self.parent_protocol, self.parent_www, self.parent_domain, self.parent_path = '', None, '', ''
-
-    def _refactor_attributes(self) -> None:
-        """
-        Refactors the attributes if needed
-        :return: None
-        """
-        if self.domain == '' or self.domain == self.parent_domain:
+            parent_protocol, parent_www, parent_domain, parent_path = '', None, '', ''
+        if self.domain == '' or self.domain == parent_domain:
             if self.protocol == '':
-                self.protocol = self.parent_protocol
+                self.protocol = parent_protocol
             if self.domain == '':
-                self.domain = self.parent_domain
-            if not self.www and self.parent_www is not None:
-                self.www = self.parent_www
-            self._refactor_path()
+                self.domain = parent_domain
+            if not self.www and parent_www is not None:
+                self.www = parent_www
+            self._refactor_path(parent_path)
         self._refactor_ending()
 
-    def _refactor_path(self):
+    def _refactor_path(self, parent_path: str) -> None:
         if self.path.startswith('./'):
-            self.path = self.parent_path + self.path[1::]
+            self.path = parent_path + self.path[1::]
         elif self.path and not self.path.startswith('/'):
-            self.path = self.parent_path + '/' + self.path
-        if self.parent_path and (self.string_url.startswith('#') or self.string_url.startswith('./#')):
-            self.path = self.parent_path
-
-    def _refactor_root_attributes(self) -> None:
-        """
-        Refactors the attributes if needed
-        :return: None
-        """
-        if self.parent_protocol == '':
-            self.parent_protocol = self.protocol
-        if self.parent_domain == '':
-            self.parent_domain = self.domain
-        if self.parent_www is None:
-            self.parent_www = self.www
+            self.path = parent_path + '/' + self.path
+        if parent_path and self.string_url.startswith(('#', './#')):
+            self.path = parent_path
 
     def _get_protocol(self) -> str:
         """
-        Gets the protocol to be used in a string representation for the url
+        Gets the protocol to be used in a string representation for the url, which is computed when constructing the
+        object
         :return: the protocol
         """
-        return self.parent_protocol if self.use_parent_protocol and self.domain == self.parent_domain and (
-                self.protocol == '' or self.protocol.startswith('http')) else self.protocol
+        return self._effective_protocol
 
 
 class UrlSet:
@@ -214,18 +299,17 @@ class UrlSet:
     """
     __slots__ = '_items'
 
-    def __init__(self, urls):
-        self._items = {}
+    def __init__(self, urls: Iterable['Url']):
+        self._items: Dict[str, 'Url'] = {}
+        setdefault = self._items.setdefault
         for url in urls:
-            self.add(url)
+            setdefault(url.get_basic_url(), url)
 
     def add(self, item: 'Url') -> None:
-        item_hash = item.get_basic_url()
-        if item_hash not in self._items:
-            self._items[item_hash] = item
+        self._items.setdefault(item.get_basic_url(), item)
 
-    def keys(self):
+    def keys(self) -> KeysView[str]:
         return self._items.keys()
 
-    def values(self):
+    def values(self) -> ValuesView['Url']:
         return self._items.values()